@@ -9,10 +9,14 @@ setup(
     install_requires=[
         'click',
         'requests',
-        'ollama',
+        'httpx',
+        'diskcache',
         'rich',
         'pyyaml',
     ],
+    extras_require={
+        'classifier': ['scikit-learn'],
+    },
     entry_points={
         'console_scripts': [
             'shai=main:main',
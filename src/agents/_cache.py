@@ -0,0 +1,52 @@
+"""
+On-disk caches for model results, shared across shAI invocations.
+Entries are keyed by a SHA-256 of their inputs and expire after CACHE_TTL seconds.
+A cache that can't be opened or written is skipped rather than failing the query.
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional
+import diskcache
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "shai")
+CACHE_TTL = 30 * 24 * 60 * 60
+
+_CACHES: Dict[str, diskcache.Cache] = {}
+
+def _key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+def _open(name: str) -> diskcache.Cache:
+    if name not in _CACHES:
+        _CACHES[name] = diskcache.Cache(os.path.join(CACHE_DIR, name))
+    return _CACHES[name]
+
+def get(name: str, *parts: str) -> Optional[Any]:
+    """
+    Looks up a cached value.
+    
+    Args:
+        name (str): The cache to use, e.g. "safety".
+        *parts (str): The inputs the value was computed from.
+        
+    Returns:
+        The cached value, or None on a miss.
+    """
+    try:
+        return _open(name).get(_key(*parts))
+    except Exception:
+        return None
+
+def put(name: str, value: Any, *parts: str) -> None:
+    """
+    Stores a value in the cache.
+    
+    Args:
+        name (str): The cache to use, e.g. "safety".
+        value: The value to store.
+        *parts (str): The inputs the value was computed from.
+    """
+    try:
+        _open(name).set(_key(*parts), value, expire=CACHE_TTL)
+    except Exception:
+        pass
@@ -0,0 +1,64 @@
+"""
+Client for a llama.cpp llama-server with grammar-constrained decoding.
+When SHAI_LLAMA_SERVER is set (e.g. http://localhost:8080), the query validator and the safety agent
+use it instead of Ollama, so the model can only emit the exact answer format and stops right after it.
+"""
+import asyncio
+import os
+import weakref
+import httpx
+
+LLAMA_SERVER = os.environ.get("SHAI_LLAMA_SERVER")
+
+# Exactly YES or NO
+YESNO_GRAMMAR = r'''
+root ::= "YES" | "NO"
+'''
+
+# Exactly {"is_safe":bool,"confidence":number,"reasoning":"..."}, with the reasoning short enough
+# that the whole object fits in the safety agent's token budget even at one token per character
+SAFETY_GRAMMAR = r'''
+root ::= "{\"is_safe\":" boolean ",\"confidence\":" confidence ",\"reasoning\":\"" reasoning "\"}"
+boolean ::= "true" | "false"
+confidence ::= "0" ("." [0-9] [0-9]?)? | "1" (".0")?
+reasoning ::= [^"\\\n]{0,72}
+'''
+
+# Pooled connections belong to the event loop that opened them, so keep one client per loop
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def _client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _CLIENTS.get(loop)
+    if client is None:
+        client = _CLIENTS[loop] = httpx.AsyncClient(base_url=LLAMA_SERVER or "http://localhost:8080", timeout=60)
+    return client
+
+def is_enabled() -> bool:
+    """
+    Returns True if a llama-server has been configured.
+    """
+    return bool(LLAMA_SERVER)
+
+async def complete(prompt: str, grammar: str, n_predict: int = 16) -> str:
+    """
+    Runs a grammar-constrained completion on the llama-server.
+    The server serves a single model, and cache_prompt lets it reuse the KV cache for a shared prompt prefix.
+    
+    Args:
+        prompt (str): The prompt to complete.
+        grammar (str): GBNF grammar the output must match.
+        n_predict (int): Maximum number of tokens to generate.
+        
+    Returns:
+        str: The generated text.
+    """
+    response = await _client().post("/completion", json={
+        "prompt": prompt,
+        "grammar": grammar,
+        "n_predict": n_predict,
+        "temperature": 0,
+        "cache_prompt": True
+    })
+    response.raise_for_status()
+    return response.json()["content"].strip()
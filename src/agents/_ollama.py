@@ -0,0 +1,141 @@
+"""
+Shared Ollama client used by all the agents.
+Requests go straight to the server's /api/chat endpoint over a pooled HTTP connection that is
+reused across agent calls. Pooled connections belong to the event loop that opened them, so each
+running loop gets its own client. Every request asks the server to keep the model loaded so consecutive
+calls don't pay for a reload.
+"""
+import asyncio
+import json
+import os
+import weakref
+from typing import Any, AsyncIterator, Dict, List
+from urllib.parse import urlsplit
+import httpx
+
+# How long the server should keep a model in memory after a request
+KEEP_ALIVE = "30m"
+
+def _base_url() -> str:
+    """
+    Builds the server URL from OLLAMA_HOST the same way the ollama client does: a bare host
+    uses port 11434, an explicit http:// or https:// scheme uses 80 or 443, and a missing host is 127.0.0.1.
+    """
+    host = (os.environ.get("OLLAMA_HOST") or "").strip()
+    scheme, _, hostport = host.partition("://")
+    port = 11434
+    if not hostport:
+        scheme, hostport = "http", host
+    elif scheme == "http":
+        port = 80
+    elif scheme == "https":
+        port = 443
+    
+    parsed = urlsplit(f"{scheme}://{hostport}")
+    hostname = parsed.hostname or "127.0.0.1"
+    if ":" in hostname:
+        hostname = f"[{hostname}]"
+    return f"{scheme}://{hostname}:{parsed.port or port}{parsed.path.rstrip('/')}"
+
+# Clients and background model loads started by warm(), by event loop
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_WARMUPS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task[None]]]" = weakref.WeakKeyDictionary()
+
+def _client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _CLIENTS.get(loop)
+    if client is None:
+        client = _CLIENTS[loop] = httpx.AsyncClient(base_url=_base_url(), timeout=120)
+    return client
+
+async def _load(model: str) -> None:
+    try:
+        # A chat request without messages only loads the model
+        response = await _client().post("/api/chat", json={"model": model, "messages": [], "keep_alive": KEEP_ALIVE})
+        response.raise_for_status()
+    except Exception:
+        # The first real request will report the problem
+        pass
+
+def warm(*models: str) -> None:
+    """
+    Starts loading the models into memory in the background, so the first real request
+    for each of them doesn't pay for the load. Must be called from a running event loop.
+    
+    Args:
+        *models (str): The models to load.
+    """
+    warmups = _WARMUPS.setdefault(asyncio.get_running_loop(), {})
+    for model in models:
+        if model not in warmups:
+            warmups[model] = asyncio.ensure_future(_load(model))
+
+async def _wait_for_warmup(model: str) -> None:
+    task = _WARMUPS.get(asyncio.get_running_loop(), {}).get(model)
+    if task is not None:
+        # Shielded so a cancelled request doesn't cancel the load for everyone else
+        await asyncio.shield(task)
+
+def _request_body(model: str, messages: List[Dict[str, str]], num_predict: int, stream: bool, **kwargs) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE,
+        "options": {"num_predict": num_predict, "temperature": 0},
+        **kwargs
+    }
+
+async def chat(model: str, messages: List[Dict[str, str]], num_predict: int = 64, verbose: bool = False, **kwargs) -> Dict[str, Any]:
+    """
+    Sends a chat request through the shared client with deterministic decoding.
+    
+    Args:
+        model (str): The model to use.
+        messages (list): The chat messages.
+        num_predict (int): Maximum number of tokens to generate (-1 for no limit).
+        verbose (bool): If True, prints prompt evaluation timings. Prompt tokens served from the
+            server's cache for a repeated prefix are not evaluated again.
+        **kwargs: Extra fields for the request body, e.g. format.
+        
+    Returns:
+        dict: The chat response.
+    """
+    await _wait_for_warmup(model)
+    response = await _client().post("/api/chat", json=_request_body(model, messages, num_predict, False, **kwargs))
+    response.raise_for_status()
+    response = response.json()
+    
+    if verbose:
+        prompt_ms = (response.get("prompt_eval_duration") or 0) / 1e6
+        eval_ms = (response.get("eval_duration") or 0) / 1e6
+        print(f"Prompt eval: {response.get('prompt_eval_count')} tokens in {prompt_ms:.0f} ms, "
+              f"generation: {response.get('eval_count')} tokens in {eval_ms:.0f} ms")
+    
+    return response
+
+async def chat_stream(model: str, messages: List[Dict[str, str]], num_predict: int = 64, **kwargs) -> AsyncIterator[str]:
+    """
+    Streams the response content as the model generates it.
+    Closing the generator before the response is complete drops the connection, which makes
+    the server stop generating.
+    
+    Args:
+        model (str): The model to use.
+        messages (list): The chat messages.
+        num_predict (int): Maximum number of tokens to generate (-1 for no limit).
+        **kwargs: Extra fields for the request body, e.g. format.
+        
+    Yields:
+        str: The next piece of the response content.
+    """
+    await _wait_for_warmup(model)
+    body = _request_body(model, messages, num_predict, True, **kwargs)
+    async with _client().stream("POST", "/api/chat", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            content = json.loads(line).get("message", {}).get("content")
+            if content:
+                yield content
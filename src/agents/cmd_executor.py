@@ -2,71 +2,198 @@
 This agent takes a list of commands to execute and executes them in order.
 Upon successful execution, it returns a success statement else it returns a failure statement.
 """
+import asyncio
+import codecs
+import io
+import os
+import re
+import shlex
+import shutil
 import sys
-import subprocess
-from typing import Dict, List, Union
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from rich.console import Console
 
-def execute_commands(commands: List[str], verbose: bool = False) -> Dict[str, Union[bool, List[Dict[str, Union[str, int]]]]]:
+console = Console()
+error_console = Console(stderr=True)
+
+# Size of the reads used when streaming command output
+_CHUNK_SIZE = 64 * 1024
+
+_SEPARATOR = "-" * 50 + "\n"
+
+class CmdResult(NamedTuple):
     """
-    Executes a list of shell commands and returns the output.
+    The outcome of a single command.
+    stdout and stderr are empty when the output was streamed without being kept.
+    """
+    command: str
+    exit_code: int
+    stdout: str
+    stderr: str
+    stdout_bytes: int
+    stderr_bytes: int
+
+# Characters that need a shell to interpret (chaining, redirection, expansion, globbing, comments)
+_NEEDS_SHELL = re.compile(r'[;&|<>$`*?()\[\]{}~#\n]')
 
+def _split_command(command: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Splits a command into argv if it can be executed without a shell.
+    
     Args:
-        commands (list): The list of commands to execute.
-        verbose (bool): If True, prints the command before executing it.
+        command (str): The command to split.
+        
+    Returns:
+        tuple: (absolute path of the executable, argv), or None if the command needs a shell.
+    """
+    if _NEEDS_SHELL.search(command):
+        return None
+    
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    
+    # Shell builtins (cd, export, ...) and variable assignments have no executable to run
+    executable = shutil.which(argv[0]) if argv and "=" not in argv[0] else None
+    if executable is None:
+        return None
+    
+    return os.path.abspath(executable), argv
 
+async def _pump(stream: asyncio.StreamReader, output: Console, capture: bool) -> Tuple[int, str]:
+    """
+    Copies a subprocess stream to the console as it is produced.
+    
+    Args:
+        stream (StreamReader): The subprocess stdout or stderr.
+        output (Console): The console to write the output to.
+        capture (bool): If True, also keeps a copy of the output.
+        
     Returns:
-        dict: A dictionary containing success status and detailed results for each command
+        tuple: (number of bytes read, captured text or an empty string)
     """
-    if verbose:
-        print(f"Executing commands: {commands}")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = io.StringIO() if capture else None
+    total = 0
+    
+    while True:
+        chunk = await stream.read(_CHUNK_SIZE)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            output.out(text, end="", highlight=False)
+            if buffer is not None:
+                buffer.write(text)
+        if not chunk:
+            break
+        total += len(chunk)
     
-    results = []
-    success = True
+    return total, buffer.getvalue() if buffer is not None else ""
+
+async def _run_command(command: str, verbose: bool = False, stream: bool = False) -> CmdResult:
+    """
+    Runs a single shell command and collects its output.
+    
+    Args:
+        command (str): The command to execute.
+        verbose (bool): If True, prints the command before executing it.
+        stream (bool): If True, writes the output to the console while the command runs
+            instead of buffering it. The output is then only kept in the result if verbose is set.
+        
+    Returns:
+        CmdResult: The command, its exit code, stdout and stderr, and the size of stdout and stderr in bytes
+    """
+    if verbose:
+        print(f"Executing command: {command}")
     
     try:
-        for command in commands:
-            if verbose:
-                print(f"Executing command: {command}")
-            
-            process = subprocess.run(
+        split = _split_command(command)
+        if split is None:
+            process = await asyncio.create_subprocess_shell(
                 command,
-                shell=True,
-                text=True,
-                capture_output=True
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
-            
-            cmd_result = {
-                "command": command,
-                "exit_code": process.returncode,
-                "stdout": process.stdout,
-                "stderr": process.stderr
-            }
-            
-            results.append(cmd_result)
-            
-            if process.returncode != 0:
-                if verbose:
-                    print(f"Command failed with exit code {process.returncode}")
-                    print(f"Error: {process.stderr}")
-                success = False
-                # Continue executing the remaining commands even if one fails
-    
+        else:
+            # An absolute executable path and close_fds=False let subprocess create the child
+            # with a single posix_spawn() call instead of fork() + exec()
+            executable, argv = split
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                executable=executable,
+                close_fds=False,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        
+        if stream:
+            (stdout_bytes, stdout), (stderr_bytes, stderr) = await asyncio.gather(
+                _pump(process.stdout, console, verbose),
+                _pump(process.stderr, error_console, verbose)
+            )
+            await process.wait()
+        else:
+            stdout_data, stderr_data = await process.communicate()
+            stdout_bytes, stderr_bytes = len(stdout_data), len(stderr_data)
+            stdout, stderr = stdout_data.decode(errors="replace"), stderr_data.decode(errors="replace")
     except Exception as e:
         if verbose:
             print(f"Error executing command: {str(e)}", file=sys.stderr)
-        success = False
-        results.append({
-            "command": command if 'command' in locals() else "unknown",
-            "exit_code": -1,
-            "stdout": "",
-            "stderr": str(e)
-        })
+        return CmdResult(command, -1, "", str(e), 0, 0)
+    
+    if process.returncode != 0 and verbose:
+        print(f"Command failed with exit code {process.returncode}")
+        if not stream:
+            print(f"Error: {stderr}")
+    
+    return CmdResult(command, process.returncode, stdout, stderr, stdout_bytes, stderr_bytes)
+
+async def execute_commands_async(
+    commands: List[str],
+    verbose: bool = False,
+    independent: bool = False,
+    stream: bool = False
+) -> Dict[str, Union[bool, List[CmdResult]]]:
+    """
+    Executes a list of shell commands and returns the output.
+
+    Args:
+        commands (list): The list of commands to execute.
+        verbose (bool): If True, prints the command before executing it.
+        independent (bool): If True, the commands don't depend on each other and are run concurrently.
+            Otherwise they are run one after another in order.
+        stream (bool): If True, writes each command's output to the console as it is produced.
+
+    Returns:
+        dict: A dictionary containing success status and detailed results for each command
+    """
+    if verbose:
+        print(f"Executing commands: {commands}")
+    
+    if independent:
+        results = list(await asyncio.gather(*(_run_command(command, verbose, stream) for command in commands)))
+    else:
+        results = []
+        for command in commands:
+            # Continue executing the remaining commands even if one fails
+            results.append(await _run_command(command, verbose, stream))
     
     return {
-        "success": success,
+        "success": all(result.exit_code == 0 for result in results),
         "results": results
     }
 
+def execute_commands(
+    commands: List[str],
+    verbose: bool = False,
+    independent: bool = False,
+    stream: bool = False
+) -> Dict[str, Union[bool, List[CmdResult]]]:
+    """
+    Synchronous wrapper around execute_commands_async for callers without an event loop.
+    """
+    return asyncio.run(execute_commands_async(commands, verbose=verbose, independent=independent, stream=stream))
+
 def format_results(execution_results: Dict) -> str:
     """
     Format the execution results into a readable string.
@@ -78,23 +205,23 @@ def format_results(execution_results: Dict) -> str:
         str: A formatted string with the results
     """
     if execution_results["success"]:
-        output = "All commands executed successfully.\n\n"
+        parts = ["All commands executed successfully.\n\n"]
     else:
-        output = "Some commands failed during execution.\n\n"
+        parts = ["Some commands failed during execution.\n\n"]
     
     for i, result in enumerate(execution_results["results"]):
-        output += f"Command {i+1}: {result['command']}\n"
-        output += f"Exit code: {result['exit_code']}\n"
+        parts.append(f"Command {i+1}: {result.command}\nExit code: {result.exit_code}\n")
         
-        if result["stdout"]:
-            output += f"Output:\n{result['stdout']}\n"
+        # Output may be large, so append it as is rather than copying it into an f-string
+        if result.stdout:
+            parts.extend(("Output:\n", result.stdout, "\n"))
         
-        if result["stderr"]:
-            output += f"Errors:\n{result['stderr']}\n"
+        if result.stderr:
+            parts.extend(("Errors:\n", result.stderr, "\n"))
         
-        output += "-" * 50 + "\n"
+        parts.append(_SEPARATOR)
     
-    return output
+    return "".join(parts)
 
 if __name__ == "__main__":
     commands = ["echo 'Hello World'", "ls -la", "cat non_existent_file"]  # Example commands to execute
@@ -1,33 +1,74 @@
 """
 This agent takes the input as a string which is the Natural Language command and then outputs bash command/s.
 """
-import ollama
+import asyncio
 import sys
+from typing import Optional
+from agents import _cache
+from agents._ollama import chat
+from agents.config import GENERATOR_MODEL
 
-def generate_command(input: str, verbose: bool = False) -> str:
+# Fixed instructions, sent as the system message so every request starts with the same prefix
+SYSTEM_PROMPT = """You are a command generator agent. Your task is to generate a bash command based on the input string given by the user.
+
+IMPORTANT: Respond ONLY with the raw bash command, without any explanations, markdown formatting, or backticks.
+Do not include any other text in your response, just the executable command."""
+
+def get_cached_command(input: str, model: str = GENERATOR_MODEL) -> Optional[str]:
     """
-    Generates bash command/s from the input string.
+    Returns the command previously generated for the input string, if any.
     
     Args:
         input (str): The input string.
+        model (str): The model the command was generated with.
         
     Returns:
-        str: The generated bash command.
+        str: The cached command, or None.
+    """
+    return _cache.get("commands", model, input)
+
+def cache_command(input: str, command: str, model: str = GENERATOR_MODEL) -> None:
     """
-    prompt = f"""
-    You are a command generator agent. Your task is to generate a bash command based on the input string.
-    The input string is: {input}
+    Remembers the command generated for the input string.
+    Callers should only cache commands that passed the safety check.
     
-    IMPORTANT: Respond ONLY with the raw bash command, without any explanations, markdown formatting, or backticks.
-    Do not include any other text in your response, just the executable command.
+    Args:
+        input (str): The input string.
+        command (str): The generated command.
+        model (str): The model the command was generated with.
+    """
+    if command:
+        _cache.put("commands", command, model, input)
+
+async def generate_command(input: str, verbose: bool = False, model: str = GENERATOR_MODEL) -> str:
     """
+    Generates bash command/s from the input string.
+    
+    Args:
+        input (str): The input string.
+        verbose (bool): Whether to print verbose output.
+        model (str): The model to use for generation.
+        
+    Returns:
+        str: The generated bash command.
+    """
+    cached = get_cached_command(input, model)
+    if cached is not None:
+        if verbose:
+            print("Using cached command.")
+        return cached
     
     try:
         if verbose:
-            print("Sending request to ollama model...")
-        response = ollama.chat(
-            model="codellama:latest", 
-            messages=[{"role": "user", "content": prompt}]
+            print(f"Sending request to ollama model '{model}'...")
+        response = await chat(
+            model=model, 
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": input}
+            ],
+            num_predict=128,
+            verbose=verbose
         )
         
         if verbose:
@@ -49,5 +90,5 @@ def generate_command(input: str, verbose: bool = False) -> str:
 if __name__ == "__main__":
     input_string = "List all files in the current directory"
     print(f"Input: '{input_string}'")
-    command = generate_command(input_string)
+    command = asyncio.run(generate_command(input_string))
     print(f"Generated command: {command}")
\ No newline at end of file
@@ -3,10 +3,16 @@ This agent takes the bash command as input and verifies the safety of the comman
 It checks if the command contains any dangerous or potentially harmful operations.
 It also checks if the command is a valid bash command.
 """
-import ollama 
+import asyncio
+import json
 import sys
 import re
-from typing import Dict, Tuple, List, Optional
+import shlex
+from typing import AsyncIterator, Dict, Tuple, List, Optional
+from agents import _cache, _llama_client
+from agents._ollama import chat, chat_stream
+from agents.config import GENERATOR_MODEL, SAFETY_MODEL
+from agents.safety_model import predict_safe_probability
 
 # Common dangerous commands/patterns
 DANGEROUS_PATTERNS = [
@@ -25,32 +31,249 @@ SAFE_COMMANDS = [
     "mkdir", "touch", "cp", "mv", "date", "whoami", "ping", "clear"
 ]
 
-def pattern_based_check(command: str) -> bool:
+# Read-only or otherwise harmless utilities that can skip the LLM check.
+# Tools that can run other programs (pagers, preprocessors, calculators with shell escapes),
+# write arbitrary files, or kill processes from an interactive UI (top, htop, ...) are deliberately left out.
+READ_ONLY_COMMANDS = [
+    # Files and directories
+    "dir", "vdir", "tree", "stat", "file", "du", "df", "realpath", "readlink",
+    "basename", "dirname", "pathchk", "lsattr", "mktemp", "locate", "which",
+    "whereis", "type",
+    # Viewing and searching text
+    "tac", "nl", "od", "hexdump", "strings", "egrep", "fgrep", "zgrep",
+    "zegrep", "zfgrep", "zcat", "bzcat", "xzcat", "lzcat", "zstdcat", "look",
+    "jq",
+    # Text processing to stdout
+    "wc", "sort", "cut", "paste", "join", "tr", "fold", "fmt", "pr", "rev",
+    "expand", "unexpand", "comm", "column", "numfmt", "tsort", "shuf",
+    "iconv", "printf", "seq", "factor", "expr", "test", "true", "false",
+    "cal", "ncal",
+    # Comparing and hashing
+    "cmp", "diff", "sdiff", "diff3", "md5sum", "sha1sum", "sha224sum",
+    "sha256sum", "sha384sum", "sha512sum", "b2sum", "cksum", "sum",
+    "base32", "base64",
+    # Users and sessions
+    "id", "groups", "who", "w", "users", "logname", "last", "finger",
+    "getent", "tty", "history",
+    # System information
+    "uname", "uptime", "arch", "nproc", "free", "printenv", "locale",
+    "getconf", "lsb_release", "lscpu", "lsblk", "lsusb", "lspci", "lsmod",
+    "lshw", "lsof", "sensors", "fc-list", "tput",
+    # Processes and resource usage
+    "ps", "pstree", "pgrep", "pidof", "vmstat", "iostat", "mpstat",
+    "pidstat", "sar", "nload",
+    # Networking diagnostics
+    "traceroute", "tracepath", "mtr", "dig", "nslookup", "host", "whois",
+    "netstat", "ss", "arp",
+    # Documentation
+    "info", "help", "whatis", "apropos", "tldr",
+    # Miscellaneous
+    "sleep", "reset",
+]
+
+# Options that make an otherwise safe command execute programs, write files or change system state.
+# Long options also match their GNU abbreviations (e.g. --out for --output).
+RISKY_ARGUMENTS = {
+    "find": ["-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprint0", "-fprintf", "-fls"],
+    "sort": ["-o", "--output", "--compress-program"],
+    "shuf": ["-o", "--output"],
+    "iconv": ["-o", "--output"],
+    "sdiff": ["-o", "--output"],
+    "tree": ["-o"],
+    "info": ["-o", "--output", "--dribble"],
+    "sar": ["-o"],
+    "file": ["-C", "--compile"],
+    "date": ["-s", "--set"],
+    "lshw": ["-dump"],
+    "sensors": ["-s", "--set"],
+    "ss": ["-K", "--kill"],
+    "arp": ["-d", "--delete", "-s", "--set", "-f", "--file"],
+    "zstdcat": ["--rm"],
+}
+
+# System messages for the safety agent; the command itself is sent as the user message
+SAFETY_SYSTEM_PROMPT = """You are a command safety agent. Your task is to validate the bash command given by the user for safety.
+
+Respond in JSON format as follows:
+{
+    "is_safe": true or false,
+    "confidence": number between 0 and 1,
+    "reasoning": "brief explanation of your decision"
+}
+
+Safe commands don't damage the system, don't delete important data, don't compromise security,
+and don't execute unverified code from the internet."""
+
+# How far from 0.5 the local classifier's probability must be to skip the LLM
+CLASSIFIER_MARGIN = 0.4
+
+# Longest reasoning the model may write, so the JSON always fits within the decoding limit
+REASONING_MAX_LENGTH = 72
+
+# Structured output schema for the safety response
+SAFETY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_safe": {"type": "boolean"},
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string", "maxLength": REASONING_MAX_LENGTH}
+    },
+    "required": ["is_safe", "confidence", "reasoning"]
+}
+
+EXPLAIN_SYSTEM_PROMPT = """Analyze the bash command given by the user for security risks.
+
+Provide a clear, concise explanation of:
+1. What the command does
+2. What specific security or system risks it poses
+3. What safer alternatives might exist
+
+Format your response as plain text without markdown formatting."""
+
+_DANGER_RE = re.compile("|".join(f"(?:{pattern})" for pattern in DANGEROUS_PATTERNS))
+_SAFE_SET = frozenset(SAFE_COMMANDS + READ_ONLY_COMMANDS)
+_RISKY_ARGUMENTS = {command: frozenset(flags) for command, flags in RISKY_ARGUMENTS.items()}
+_SHELL_METACHARS_RE = re.compile(r"[;|&$`<>\n]")
+
+def _has_risky_argument(argv: List[str]) -> bool:
+    """
+    Checks if any argument is one of the command's risky options.
+    
+    Args:
+        argv (list): The split command.
+        
+    Returns:
+        bool: True if a risky option is present.
     """
-    Perform a quick pattern-based check for obviously dangerous commands.
+    risky = _RISKY_ARGUMENTS.get(argv[0])
+    if not risky:
+        return False
+    
+    # Single-letter options can also appear inside a cluster, e.g. -uo for -u -o
+    short = {flag[1] for flag in risky if len(flag) == 2 and flag[1] != "-"}
+    long = [flag for flag in risky if flag.startswith("--")]
+    
+    for arg in argv[1:]:
+        if arg == "--":
+            break
+        name = arg.split("=", 1)[0]
+        if name in risky:
+            return True
+        if name.startswith("--"):
+            if len(name) > 2 and any(flag.startswith(name) for flag in long):
+                return True
+        elif name.startswith("-") and any(char in short for char in name[1:]):
+            return True
+    
+    return False
+
+def pattern_based_check(command: str) -> Optional[bool]:
+    """
+    Perform a quick pattern-based check for obviously dangerous or obviously safe commands.
     
     Args:
         command (str): The bash command to check.
     
     Returns:
-        bool: False if definitely dangerous, True otherwise.
+        bool: False if definitely dangerous, True if definitely safe, None if the LLM needs to decide.
     """
     # Check for dangerous patterns
-    for pattern in DANGEROUS_PATTERNS:
-        if re.search(pattern, command):
-            return False
+    if _DANGER_RE.search(command):
+        return False
+    
+    # Pipes, redirections, chaining and substitutions can hide anything, so leave those to the LLM
+    if _SHELL_METACHARS_RE.search(command):
+        return None
+    
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
     
-    # Simple whitelist check for basic safe commands
-    if any(command.strip().startswith(safe_cmd) for safe_cmd in SAFE_COMMANDS):
+    # Whitelist check on the executable itself
+    if argv and argv[0] in _SAFE_SET and not _has_risky_argument(argv):
         return True
     
     # If not immediately identifiable, we'll need the LLM to check
     return None
 
-def validate_command(
+async def _query_safety_model(command: str, verbose: bool = False, model: str = SAFETY_MODEL) -> str:
+    """
+    Asks the model whether the command is safe.
+    
+    Args:
+        command (str): The bash command to validate.
+        verbose (bool): Whether to print verbose output.
+        model (str): The model to use for validation. Ignored when a llama-server is configured.
+        
+    Returns:
+        str: The raw model response.
+    """
+    if _llama_client.is_enabled():
+        if verbose:
+            print(f"Sending request to llama-server at {_llama_client.LLAMA_SERVER} for command validation...")
+        prompt = f"{SAFETY_SYSTEM_PROMPT}\n\nCommand: {command}\n\nResponse: "
+        return await _llama_client.complete(prompt, _llama_client.SAFETY_GRAMMAR, n_predict=96)
+    
+    if verbose:
+        print(f"Sending request to ollama model '{model}' for command validation...")
+    
+    # Stop reading as soon as the JSON object is complete instead of waiting for the model to finish
+    stream = chat_stream(
+        model=model, 
+        messages=[
+            {"role": "system", "content": SAFETY_SYSTEM_PROMPT},
+            {"role": "user", "content": command}
+        ],
+        num_predict=96,
+        format=SAFETY_SCHEMA
+    )
+    try:
+        return (await _read_json_object(stream)).strip()
+    finally:
+        await stream.aclose()
+
+async def _read_json_object(chunks: AsyncIterator[str]) -> str:
+    """
+    Reads streamed text up to the end of the first top-level JSON object.
+    
+    Args:
+        chunks (AsyncIterator[str]): The streamed response content.
+        
+    Returns:
+        str: The text read so far, ending with the closing brace if the object was completed.
+    """
+    parts = []
+    depth = 0
+    in_string = False
+    escaped = False
+    
+    async for chunk in chunks:
+        for i, char in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"' and depth:
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}" and depth:
+                depth -= 1
+                if depth == 0:
+                    parts.append(chunk[:i + 1])
+                    return "".join(parts)
+        parts.append(chunk)
+    
+    return "".join(parts)
+
+async def validate_command(
     command: str, 
     verbose: bool = False, 
-    model: str = "codellama:latest",
+    model: str = SAFETY_MODEL,
     get_explanation: bool = False,
     confidence_threshold: float = 0.8
 ) -> Dict:
@@ -60,7 +283,7 @@ def validate_command(
     Args:
         command (str): The bash command to validate.
         verbose (bool): Whether to print verbose output.
-        model (str): The model to use for validation.
+        model (str): The model to use for validation. Ignored when a llama-server is configured.
         get_explanation (bool): Whether to get an explanation for unsafe commands.
         confidence_threshold (float): Minimum confidence level to trust the model's decision.
         
@@ -81,57 +304,39 @@ def validate_command(
         }
         return result
     
-    # If pattern check is inconclusive, use LLM
-    safety_prompt = f"""
-    You are a command safety agent. Your task is to validate the bash command for safety.
-    The command is: {command}
-    
-    Respond in JSON format as follows:
-    {{
-        "is_safe": true or false,
-        "confidence": number between 0 and 1,
-        "reasoning": "brief explanation of your decision"
-    }}
+    # Then ask the local classifier, if one is installed, and keep only its confident decisions
+    probability = predict_safe_probability(command)
+    if probability is not None and abs(probability - 0.5) > CLASSIFIER_MARGIN:
+        is_safe = probability > 0.5
+        confidence = probability if is_safe else 1 - probability
+        if verbose:
+            print(f"Local classifier decision: safe probability {probability:.2f}")
+        return {
+            'is_safe': is_safe and confidence >= confidence_threshold,
+            'confidence': confidence,
+            'explanation': "Classifier-based decision" if get_explanation or verbose else None
+        }
     
-    Safe commands don't damage the system, don't delete important data, don't compromise security,
-    and don't execute unverified code from the internet.
-    """   
+    # If pattern check is inconclusive, use LLM, unless it has already assessed this command
+    backend = f"llama-server:{_llama_client.LLAMA_SERVER}" if _llama_client.is_enabled() else model
+    cached = _cache.get("safety", backend, command)
     
     try:
-        if verbose:
-            print(f"Sending request to ollama model '{model}' for command validation...")
-        
-        response = ollama.chat(
-            model=model, 
-            messages=[{"role": "user", "content": safety_prompt}]
-        )
-        safety_response = response['message']['content'].strip()
-        
-        if verbose:
-            print("Response received from model for command validation: ", safety_response)
-        
-        # Extract JSON from response, handling potential code blocks
-        import json
-        if "```json" in safety_response:
-            json_str = safety_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in safety_response:
-            json_str = safety_response.split("```")[1].strip()
+        if cached is not None:
+            if verbose:
+                print("Using cached safety assessment: ", cached)
+            result = dict(cached)
         else:
-            json_str = safety_response.strip()
-        
-        # Clean up any remaining markdown or quotes
-        json_str = re.sub(r'^[`"\']|[`"\']$', '', json_str)
-        
-        try:
-            result = json.loads(json_str)
-        except json.JSONDecodeError:
-            # Fallback to simpler parsing if JSON fails
-            is_safe = "true" in safety_response.lower() and not "false" in safety_response.lower()
-            result = {
-                "is_safe": is_safe,
-                "confidence": 0.5,  # Lower confidence for fallback parsing
-                "reasoning": "Parsing error - defaulting to conservative assessment"
-            }
+            safety_response = await _query_safety_model(command, verbose=verbose, model=model)
+            
+            if verbose:
+                print("Response received from model for command validation: ", safety_response)
+            
+            # Output is constrained to the schema, so anything unparseable is treated as an error
+            result = json.loads(safety_response)
+            if not isinstance(result, dict):
+                raise ValueError(f"Expected a JSON object, got: {safety_response}")
+            _cache.put("safety", result, backend, command)
         
         # Apply confidence threshold
         if result.get("confidence", 1.0) < confidence_threshold:
@@ -154,7 +359,7 @@ def validate_command(
             "explanation": f"Error during validation: {str(e)}" if get_explanation or verbose else None
         }
 
-def explain_command_risk(command: str, model: str = "codellama:latest") -> str:
+async def explain_command_risk(command: str, model: str = GENERATOR_MODEL) -> str:
     """
     Provides a detailed explanation of why a command might be risky.
     
@@ -165,21 +370,14 @@ def explain_command_risk(command: str, model: str = "codellama:latest") -> str:
     Returns:
         str: Explanation of the command's risks.
     """
-    prompt = f"""
-    Analyze this bash command for security risks: {command}
-    
-    Provide a clear, concise explanation of:
-    1. What the command does
-    2. What specific security or system risks it poses
-    3. What safer alternatives might exist
-    
-    Format your response as plain text without markdown formatting.
-    """
-    
     try:
-        response = ollama.chat(
+        response = await chat(
             model=model, 
-            messages=[{"role": "user", "content": prompt}]
+            messages=[
+                {"role": "system", "content": EXPLAIN_SYSTEM_PROMPT},
+                {"role": "user", "content": command}
+            ],
+            num_predict=-1
         )
         explanation = response['message']['content'].strip()
         
@@ -204,7 +402,7 @@ if __name__ == "__main__":
     ]
     
     for command in commands:
-        result = validate_command(command, verbose=True, get_explanation=True)
+        result = asyncio.run(validate_command(command, verbose=True, get_explanation=True))
         print(f"Command: {command}")
         print(f"Safe: {result['is_safe']} (Confidence: {result['confidence']:.2f})")
         if not result['is_safe'] and 'explanation' in result:
@@ -4,67 +4,92 @@ This module checks if the query is conversational or if it can be converted to a
 It uses a set of conversational patterns and a language model to determine the intent of the query.
 """
 import re
-import ollama
 from rich.console import Console
+from agents import _llama_client
+from agents._ollama import chat
+from agents.config import VALIDATOR_MODEL
 
 console = Console()
 
-def validate_query(query: str, verbose=False)-> tuple:
+# Conversational patterns that indicate chatbot usage
+CONVERSATIONAL_PATTERNS = [
+    r"^(hi|hello|hey|greetings)",
+    r"how are you",
+    r"what's your name",
+    r"who (are|created) you",
+    r"tell me (about|a) joke",
+    r"can you help me with (.+\?)",
+    r"what do you think about",
+    r"explain \w+ to me"
+]
+
+# All patterns combined so a query is scanned once
+_CONVERSATIONAL_RE = re.compile("|".join(f"(?:{pattern})" for pattern in CONVERSATIONAL_PATTERNS), re.IGNORECASE)
+
+# Only the query changes between calls, so the instructions live in the system message
+SYSTEM_PROMPT = """Determine if the query given by the user is asking for a bash command or shell operation.
+ONLY respond with "YES" if the query is asking for a bash command or shell operation.
+Respond with "NO" if the query is seeking general information, conversation, or anything not suitable for bash command generation."""
+
+def precheck_query(query: str, verbose=False) -> tuple:
     """
-    Validates if the query is appropriate for shell command generation.
-    Returns a tuple of (is_valid, reason).
+    Runs the local checks on the query, without asking the LLM.
     
     Parameters:
     query (str): The natural language query to validate
     verbose (bool): Whether to show detailed information
     
     Returns:
-    tuple: (is_valid, reason)
+    tuple: (is_valid, reason), where is_valid is False if the query is definitely not a shell request
     """
     if not query or query.strip() == "":
         return False, "Empty query"
     
     # Check for conversational patterns that indicate chatbot usage
-    conversational_patterns = [
-        r"^(hi|hello|hey|greetings)",
-        r"how are you",
-        r"what's your name",
-        r"who (are|created) you",
-        r"tell me (about|a) joke",
-        r"can you help me with (.+\?)",
-        r"what do you think about",
-        r"explain \w+ to me"
-    ]
+    match = _CONVERSATIONAL_RE.search(query)
+    if match:
+        if verbose:
+            console.print(f"[yellow]Query detected as conversational based on pattern match: {match.group(0)}[/yellow]")
+        return False, "This appears to be a conversational query rather than a shell command request"
+    
+    return True, "Query passed the local checks"
+
+async def validate_query(query: str, verbose=False)-> tuple:
+    """
+    Validates if the query is appropriate for shell command generation.
+    Returns a tuple of (is_valid, reason).
     
-    for pattern in conversational_patterns:
-        if re.search(pattern, query.lower()):
-            if verbose:
-                console.print(f"[yellow]Query detected as conversational based on pattern: {pattern}[/yellow]")
-            return False, "This appears to be a conversational query rather than a shell command request"
+    Parameters:
+    query (str): The natural language query to validate
+    verbose (bool): Whether to show detailed information
+    
+    Returns:
+    tuple: (is_valid, reason)
+    """
+    is_valid, reason = precheck_query(query, verbose=verbose)
+    if not is_valid:
+        return False, reason
     
     # Use LLM to evaluate if the query is appropriate for bash command generation
     try:
         if verbose:
             console.print("[yellow]Checking query intent with LLM...[/yellow]")
         
-        prompt = f"""
-        Determine if the following query is asking for a bash command or shell operation.
-        ONLY respond with "YES" if the query is asking for a bash command or shell operation.
-        Respond with "NO" if the query is seeking general information, conversation, or anything not suitable for bash command generation.
-        
-        Query: {query}
-        
-        Response (YES/NO):
-        """
-        
-        response = ollama.chat(model='codellama', messages=[
-            {
-                'role': 'user',
-                'content': prompt
-            }
-        ])
-        
-        result = response['message']['content'].strip().upper()
+        if _llama_client.is_enabled():
+            prompt = f"{SYSTEM_PROMPT}\n\nQuery: {query}\n\nResponse (YES/NO): "
+            result = await _llama_client.complete(prompt, _llama_client.YESNO_GRAMMAR, n_predict=2)
+        else:
+            response = await chat(model=VALIDATOR_MODEL, messages=[
+                {
+                    'role': 'system',
+                    'content': SYSTEM_PROMPT
+                },
+                {
+                    'role': 'user',
+                    'content': query
+                }
+            ], num_predict=8, verbose=verbose)
+            result = response['message']['content'].strip().upper()
         
         if verbose:
             console.print(f"[yellow]LLM validation result: {result}[/yellow]")
@@ -0,0 +1,8 @@
+"""
+Models used by the agents.
+Command generation needs a code model, while the query validator and the safety agent only emit
+YES/NO or a small JSON object, so a much smaller model is enough for them.
+"""
+GENERATOR_MODEL = "codellama:latest"
+SAFETY_MODEL = "llama3.2:1b"
+VALIDATOR_MODEL = "llama3.2:1b"
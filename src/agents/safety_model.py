@@ -0,0 +1,94 @@
+"""
+Optional local classifier for command safety.
+A character n-gram logistic regression answers clear-cut safety checks in well under a millisecond,
+so the LLM is only asked about commands the classifier is unsure of. It is used only when scikit-learn
+is installed and a trained model exists at MODEL_PATH.
+
+Train a model offline from a tab-separated file of "<label>\t<command>" lines,
+where the label is 1 for safe commands and 0 for unsafe ones:
+
+    python -m agents.safety_model commands.tsv
+"""
+import os
+import pickle
+import sys
+from typing import Optional
+
+MODEL_PATH = os.environ.get("SHAI_SAFETY_MODEL") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety_model.pkl")
+
+_CLASSIFIER = None
+_LOADED = False
+
+def load_classifier():
+    """
+    Loads the trained classifier once.
+    
+    Returns:
+        The classifier, or None if there is no model or scikit-learn isn't installed.
+    """
+    global _CLASSIFIER, _LOADED
+    if not _LOADED:
+        _LOADED = True
+        if os.path.exists(MODEL_PATH):
+            try:
+                with open(MODEL_PATH, "rb") as f:
+                    _CLASSIFIER = pickle.load(f)
+            except Exception as e:
+                print(f"Could not load safety model from {MODEL_PATH}: {str(e)}", file=sys.stderr)
+    return _CLASSIFIER
+
+def predict_safe_probability(command: str) -> Optional[float]:
+    """
+    Estimates the probability that a command is safe.
+    
+    Args:
+        command (str): The bash command to classify.
+        
+    Returns:
+        float: Probability between 0 and 1, or None if no classifier is available.
+    """
+    classifier = load_classifier()
+    if classifier is None:
+        return None
+    try:
+        return float(classifier.predict_proba([command])[0, 1])
+    except Exception as e:
+        print(f"Could not classify command with safety model from {MODEL_PATH}: {str(e)}", file=sys.stderr)
+        return None
+
+def train(corpus_path: str, output_path: str = MODEL_PATH) -> None:
+    """
+    Trains the classifier on a labelled corpus and saves it.
+    
+    Args:
+        corpus_path (str): Path to the "<label>\t<command>" file.
+        output_path (str): Where to save the trained model.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    
+    labels, commands = [], []
+    with open(corpus_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            label, command = line.rstrip("\n").split("\t", 1)
+            labels.append(int(label))
+            commands.append(command)
+    
+    classifier = make_pipeline(
+        HashingVectorizer(analyzer="char_wb", ngram_range=(2, 4), alternate_sign=False),
+        LogisticRegression(max_iter=1000)
+    )
+    classifier.fit(commands, labels)
+    
+    with open(output_path, "wb") as f:
+        pickle.dump(classifier, f)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m agents.safety_model CORPUS.tsv [OUTPUT.pkl]", file=sys.stderr)
+        sys.exit(1)
+    train(*sys.argv[1:])
+    print(f"Saved safety model to {sys.argv[2] if len(sys.argv) == 3 else MODEL_PATH}")
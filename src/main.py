@@ -1,55 +1,217 @@
+import asyncio
+import json
+import sys
 import click
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
-from agents.cmd_generator import generate_command
-from agents.cmd_safety import validate_command, explain_command_risk
-from agents.cmd_executor import execute_commands, format_results
-from agents.cmd_validator import validate_query
+from agents import _llama_client
+from agents._ollama import chat, warm
+from agents.config import GENERATOR_MODEL, SAFETY_MODEL, VALIDATOR_MODEL
+from agents.cmd_generator import generate_command, get_cached_command, cache_command
+from agents.cmd_safety import validate_command, explain_command_risk, pattern_based_check, REASONING_MAX_LENGTH
+from agents.cmd_executor import execute_commands_async
+from agents.cmd_validator import precheck_query, validate_query
 
 console = Console()
 
+# System prompt for the combined pipeline; only the query is sent per request
+PIPELINE_SYSTEM_PROMPT = """You are a shell assistant. For the query given by the user, do all of the following:
+1. Determine if the query is asking for a bash command or shell operation.
+   It is not valid if it is seeking general information, conversation, or anything not suitable for bash command generation.
+2. If it is valid, generate the raw bash command for it, without any explanations, markdown formatting, or backticks.
+3. Validate the generated command for safety. Safe commands don't damage the system, don't delete important data,
+   don't compromise security, and don't execute unverified code from the internet.
+
+Respond in JSON format as follows:
+{
+    "is_query_valid": true or false,
+    "command": "the bash command, or an empty string if the query is not valid",
+    "is_safe": true or false,
+    "confidence": number between 0 and 1,
+    "reasoning": "brief explanation of your safety decision"
+}"""
+
+# Structured output schema for the combined response
+PIPELINE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_query_valid": {"type": "boolean"},
+        "command": {"type": "string"},
+        "is_safe": {"type": "boolean"},
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string", "maxLength": REASONING_MAX_LENGTH}
+    },
+    "required": ["is_query_valid", "command", "is_safe", "confidence", "reasoning"]
+}
+
+async def pipeline_agent(query: str, verbose: bool = False, model: str = GENERATOR_MODEL, confidence_threshold: float = 0.8):
+    """
+    Validates the query, generates the command and checks its safety in a single model call.
+    
+    Args:
+        query (str): The natural language query.
+        verbose (bool): Whether to print verbose output.
+        model (str): The model to use.
+        confidence_threshold (float): Minimum confidence level to trust the model's safety decision.
+        
+    Returns:
+        dict: {
+            'is_query_valid': bool,
+            'command': str,
+            'is_safe': bool,
+            'confidence': float,
+            'explanation': str
+        } or None if the model response could not be parsed.
+    """
+    try:
+        if verbose:
+            print(f"Sending combined request to ollama model '{model}'...")
+        response = await chat(
+            model=model,
+            messages=[
+                {"role": "system", "content": PIPELINE_SYSTEM_PROMPT},
+                {"role": "user", "content": query}
+            ],
+            num_predict=192,
+            verbose=verbose,
+            format=PIPELINE_SCHEMA
+        )
+        result = json.loads(response['message']['content'])
+        if not isinstance(result, dict):
+            raise json.JSONDecodeError("Expected a JSON object", response['message']['content'], 0)
+    except json.JSONDecodeError:
+        if verbose:
+            print("Could not parse the combined response, falling back to individual agents")
+        return None
+    except Exception as e:
+        print(f"Error running combined pipeline: {str(e)}", file=sys.stderr)
+        return None
+    
+    if verbose:
+        print("Response received from model: ", result)
+    
+    # The safety verdict is acted on directly, so only trust fields of the expected types
+    is_query_valid = result.get("is_query_valid")
+    command = result.get("command")
+    is_safe = result.get("is_safe")
+    confidence = result.get("confidence")
+    if (not isinstance(is_query_valid, bool) or not isinstance(command, str) or not isinstance(is_safe, bool)
+            or isinstance(confidence, bool) or not isinstance(confidence, (int, float))):
+        if verbose:
+            print("Combined response has unexpected field types, falling back to individual agents")
+        return None
+    
+    command = command.strip()
+    if is_query_valid is not True or not command:
+        return {
+            "is_query_valid": False,
+            "command": "",
+            "is_safe": False,
+            "confidence": 1.0,
+            "explanation": "Query does not appear to be asking for a shell command"
+        }
+    
+    # Pattern-based decisions override the model's own assessment
+    pattern_result = pattern_based_check(command)
+    if pattern_result is not None:
+        return {
+            "is_query_valid": True,
+            "command": command,
+            "is_safe": pattern_result,
+            "confidence": 1.0,
+            "explanation": "Pattern-based decision"
+        }
+    
+    return {
+        "is_query_valid": True,
+        "command": command,
+        "is_safe": is_safe is True and confidence >= confidence_threshold,
+        "confidence": confidence,
+        "explanation": result.get("reasoning")
+    }
+
 @click.command()
 @click.argument("query")
 @click.option("--execute/--no-execute", default=True, help="Execute the command or just show it")
 @click.option("--verbose/--no-verbose", default=False, help="Show verbose output")
-@click.option("--model", default="codellama:latest", help="Model to use for validation")
+@click.option("--model", default=GENERATOR_MODEL, help="Model to use for command generation")
 @click.option("--safety-threshold", default=0.75, type=float, help="Safety confidence threshold (0-1)")
 def main(query, execute, verbose, model, safety_threshold):
     """
     shAI - Convert natural language to bash commands and execute them.
     
     QUERY is the natural language query to convert to a bash command.
+    
+    The fallback pipeline validates the query and generates the command concurrently,
+    so set OLLAMA_NUM_PARALLEL>1 on the Ollama server to let both requests run at once.
+    """
+    asyncio.run(run(query, execute, verbose, model, safety_threshold))
+
+async def run(query: str, execute: bool, verbose: bool, model: str, safety_threshold: float):
+    """
+    Runs the full shAI pipeline for a single query.
     """
     console.print(Panel(f"[bold blue]shAI[/bold blue] - [italic]Converting your query to bash[/italic]"))
     console.print(f"Query: [yellow]{query}[/yellow]")
     
-    # Step 1: Validate the query is appropriate for command generation
-    console.print("\n[bold]Validating query...[/bold]")
-    is_valid, reason = validate_query(query, verbose=verbose)
-    
+    # Reject empty and conversational queries before any model call
+    is_valid, reason = precheck_query(query, verbose=verbose)
     if not is_valid:
         console.print(f"[bold red]⚠️  Invalid query: {reason}[/bold red]")
         console.print("[italic]Please provide a query related to shell operations or commands.[/italic]")
         return
     
-    console.print("[bold green]✓ Query is valid for command generation[/bold green]")
+    # Load the models while the rest of the pipeline gets going
+    warm(model)
+    if not _llama_client.is_enabled():
+        warm(VALIDATOR_MODEL, SAFETY_MODEL)
     
-    # Step 2: Generate the command
-    console.print("\n[bold]Generating command...[/bold]")
-    command = generate_command(query, verbose=verbose)
-    syntax = Syntax(command, "bash", theme="monokai", line_numbers=True)
-    console.print(syntax)
+    # A command generated for this query before only needs the query validated again, so skip
+    # the combined call; otherwise try to validate, generate and check the command in a single model call
+    pipeline_result = None
+    if get_cached_command(query, model) is None:
+        console.print("\n[bold]Validating query and generating command...[/bold]")
+        pipeline_result = await pipeline_agent(query, verbose=verbose, model=model, confidence_threshold=safety_threshold)
     
-    # Step 3: Validate the command for safety
-    console.print("\n[bold]Validating command safety...[/bold]")
-    safety_result = validate_command(
-        command, 
-        verbose=verbose, 
-        model=model, 
-        get_explanation=True,
-        confidence_threshold=safety_threshold
-    )
+    if pipeline_result is not None:
+        if not pipeline_result['is_query_valid']:
+            console.print(f"[bold red]⚠️  Invalid query: {pipeline_result['explanation']}[/bold red]")
+            console.print("[italic]Please provide a query related to shell operations or commands.[/italic]")
+            return
+        
+        console.print("[bold green]✓ Query is valid for command generation[/bold green]")
+        command = pipeline_result['command']
+        syntax = Syntax(command, "bash", theme="monokai", line_numbers=True)
+        console.print(syntax)
+        safety_result = pipeline_result
+    else:
+        # Step 1 & 2: Validate the query while speculatively generating the command
+        console.print("\n[bold]Validating query...[/bold]")
+        generation_task = asyncio.create_task(generate_command(query, verbose=verbose, model=model))
+        is_valid, reason = await validate_query(query, verbose=verbose)
+        
+        if not is_valid:
+            generation_task.cancel()
+            console.print(f"[bold red]⚠️  Invalid query: {reason}[/bold red]")
+            console.print("[italic]Please provide a query related to shell operations or commands.[/italic]")
+            return
+        
+        console.print("[bold green]✓ Query is valid for command generation[/bold green]")
+        
+        console.print("\n[bold]Generating command...[/bold]")
+        command = await generation_task
+        syntax = Syntax(command, "bash", theme="monokai", line_numbers=True)
+        console.print(syntax)
+        
+        # Step 3: Validate the command for safety
+        console.print("\n[bold]Validating command safety...[/bold]")
+        safety_result = await validate_command(
+            command, 
+            verbose=verbose, 
+            get_explanation=True,
+            confidence_threshold=safety_threshold
+        )
     
     if not safety_result['is_safe']:
         console.print(f"[bold red]⚠️  Command may be unsafe! Execution aborted.[/bold red]")
@@ -58,7 +220,7 @@ def main(query, execute, verbose, model, safety_threshold):
             
         if verbose:
             console.print("\n[bold]Detailed risk analysis:[/bold]")
-            risk_details = explain_command_risk(command, model=model)
+            risk_details = await explain_command_risk(command, model=model)
             console.print(Panel(risk_details, title="Risk Analysis", border_style="red"))
         else:
             console.print("[italic]Use --verbose for detailed risk analysis[/italic]")
@@ -66,25 +228,25 @@ def main(query, execute, verbose, model, safety_threshold):
     
     console.print(f"[bold green]✓ Command passed safety check (confidence: {safety_result['confidence']:.2f})[/bold green]")
     
+    # Only remember commands that passed, so a refused one is never re-judged by a weaker check later
+    cache_command(query, command, model)
+    
     # Step 4: Execute the command if requested
     if execute:
         console.print("\n[bold]Executing command...[/bold]")
-        execution_results = execute_commands([command], verbose=verbose)
-        
-        if execution_results["success"]:
-            console.print("[bold green]✓ Command executed successfully[/bold green]")
-        else:
-            console.print("[bold red]✗ Command execution failed[/bold red]")
+        console.print("\n[bold]Output:[/bold]")
+        execution_results = await execute_commands_async([command], verbose=verbose, stream=True)
         
-        # Show output
+        # Output was streamed already, but a command that couldn't be started has only its error
         for result in execution_results["results"]:
-            if result["stdout"]:
-                console.print("\n[bold]Output:[/bold]")
-                console.print(result["stdout"])
-            
-            if result["stderr"]:
+            if result.exit_code == -1 and result.stderr:
                 console.print("\n[bold red]Errors:[/bold red]")
-                console.print(result["stderr"])
+                console.print(result.stderr, markup=False, highlight=False)
+        
+        if execution_results["success"]:
+            console.print("\n[bold green]✓ Command executed successfully[/bold green]")
+        else:
+            console.print("\n[bold red]✗ Command execution failed[/bold red]")
     else:
         console.print("\n[italic]Command not executed (--no-execute flag was used)[/italic]")
 